@@ -0,0 +1,145 @@
+""" Labels SAM regions of all unlabelled images in given dataset
+by matching region color/texture statistics against regions
+of already labelled samples (nearest neighbour).
+Saves provisional labels as RGBA .PNG into 'provisional' folder
+to be reviewed in GUI (only reviewed 'labels' are used for learning).
+Run from repo root: python -m scripts.auto_label
+"""
+from pathlib import Path
+from functools import partial
+from multiprocessing import Pool
+import json
+import tomllib
+
+from PIL import Image
+import numpy as np
+from tqdm import tqdm
+
+from src.regions import region_classes
+
+MAX_DISTANCE = 0.2  # regions farther than this from every example stay unlabelled
+
+
+def region_features(image: np.ndarray, sam: np.ndarray) -> np.ndarray:
+    """Returns (n_regions, 6) array of per-region color mean/std
+    (in [0, 1] range), computed with bincount passes over SAM id map.
+    Rows of empty regions are NaN.
+    """
+    n = int(sam.max()) + 1
+    ids = sam.ravel()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        counts = np.bincount(ids, minlength=n).astype(np.float64)
+        features = []
+        for c in range(3):
+            channel = image[..., c].ravel() / 255.0
+            mean = np.bincount(ids, weights=channel, minlength=n) / counts
+            sq_mean = np.bincount(ids, weights=channel**2, minlength=n) / counts
+            features += [mean, np.sqrt(np.maximum(sq_mean - mean**2, 0))]
+    return np.column_stack(features)
+
+
+def has_label(label_path: Path) -> bool:
+    # GUI saves fully transparent label for every visited sample
+    alpha = Image.open(label_path).convert("RGBA").getchannel("A")
+    return alpha.getbbox() is not None
+
+
+def collect_examples(paths: tuple[Path, Path, Path], palette: np.ndarray):
+    image_path, label_path, sam_path = paths
+    image = np.array(Image.open(image_path).convert("RGB"))
+    label = np.array(Image.open(label_path).convert("RGBA"))
+    sam = np.array(Image.open(sam_path).convert("L"))
+    features = region_features(image, sam)
+    classes = region_classes(label, sam, palette, len(features))
+    keep = (classes > 0) & ~np.isnan(features).any(axis=1)
+    return features[keep], classes[keep]
+
+
+def label_sample(
+    paths: tuple[Path, Path, Path],
+    examples: np.ndarray,
+    targets: np.ndarray,
+    palette: np.ndarray,
+) -> bool:
+    image_path, out_path, sam_path = paths
+    image = np.array(Image.open(image_path).convert("RGB"))
+    sam = np.array(Image.open(sam_path).convert("L"))
+    features = region_features(image, sam)
+    # squared distances to every example without (regions, examples, features) array
+    sq_dists = (
+        (features**2).sum(axis=1)[:, None]
+        + (examples**2).sum(axis=1)[None, :]
+        - 2 * features @ examples.T
+    )
+    sq_dists = np.nan_to_num(sq_dists, nan=np.inf)
+    nearest = sq_dists.argmin(axis=1)
+    nearest_dist = np.sqrt(np.maximum(sq_dists[np.arange(len(nearest)), nearest], 0))
+    accepted = nearest_dist <= MAX_DISTANCE
+    accepted[0] = False  # pixels outside of any SAM mask
+    if not accepted.any():
+        return False
+    # lookup table region id -> RGBA, transparent for rejected regions
+    lut = np.zeros((len(nearest), 4), dtype=np.uint8)
+    lut[:, :3] = palette[targets[nearest] - 1]
+    lut[:, 3] = 255
+    lut[~accepted] = 0
+    Image.fromarray(lut[sam], mode="RGBA").save(out_path)
+    return True
+
+
+if __name__ == "__main__":
+    with open("config.toml", "rb") as f:
+        config = tomllib.load(f)
+    data_path = Path(config["paths"]["data"])
+    images_path = data_path / "images"
+    labels_path = data_path / "labels"
+    sam_path = data_path / "sam"
+    provisional_path = data_path / "provisional"
+    assert sam_path.exists(), "Data path must contain 'sam' folder, run preprocess_dataset.py first"  # noqa: E501
+    labels_path.mkdir(exist_ok=True)
+    provisional_path.mkdir(exist_ok=True)
+    with open(data_path / "classes.json", "r") as f:
+        classes = json.load(f)["classes"]
+    ids = np.array([c["id"] for c in classes])
+    palette = [bytes.fromhex(c["color"].lstrip("#")) for c in classes]
+    palette = np.array([list(rgb) for rgb in palette], dtype=np.uint8).reshape(-1, 3)
+
+    labelled, unlabelled = [], []
+    img_stems = [path.stem for path in sorted(images_path.iterdir())]
+    for stem in img_stems:
+        filename = f"{stem}.png"
+        image_file = images_path / filename
+        label_file = labels_path / filename
+        sam_file = sam_path / filename
+        if not sam_file.exists():
+            continue
+        if label_file.exists() and has_label(label_file):
+            labelled.append((image_file, label_file, sam_file))
+        else:
+            unlabelled.append((image_file, provisional_path / filename, sam_file))
+    assert labelled, "At least one sample must be labelled to learn from"
+
+    with Pool() as pool:
+        collected = list(
+            tqdm(
+                pool.imap(partial(collect_examples, palette=palette), labelled),
+                total=len(labelled),
+                desc="learn",
+            )
+        )
+        examples = np.concatenate([c[0] for c in collected])
+        targets = np.concatenate([c[1] for c in collected])
+        assert len(targets), "Labelled samples cover no SAM region, nothing to learn"
+        print(f"Examples: {len(targets)} regions of classes {ids[np.unique(targets) - 1].tolist()}")  # noqa: E501
+
+        worker = partial(
+            label_sample, examples=examples, targets=targets, palette=palette
+        )
+        written = sum(
+            tqdm(
+                pool.imap_unordered(worker, unlabelled),
+                total=len(unlabelled),
+                desc="label",
+            )
+        )
+        print(f"Provisional labels written: {written}/{len(unlabelled)}")
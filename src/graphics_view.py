@@ -15,10 +15,13 @@ from PyQt5.QtGui import (
     QWheelEvent,
     QBrush,
     QPainter,
+    QImage,
 )
 from PyQt5.QtWidgets import QFrame, QGraphicsView
+import numpy as np
 
 from .graphics_scene import GraphicsScene
+from .tile_journal import TileJournal
 
 
 class GraphicsView(QGraphicsView):
@@ -66,6 +69,22 @@ class GraphicsView(QGraphicsView):
 
     def clear_label(self):
         self._scene.label_item.clear()
+        self._scene.label_item.mark_dirty(self._scene.label_item.rect())
+
+    def is_label_touched(self) -> bool:
+        return self._scene.label_item.is_touched()
+
+    def take_dirty_tiles(self) -> list[tuple[QPoint, QImage]]:
+        return self._scene.label_item.take_dirty_tiles()
+
+    def restore_dirty_tiles(self, positions: list[QPoint]):
+        self._scene.label_item.restore_dirty_tiles(positions)
+
+    def replay_journal(self, journal: TileJournal):
+        self._scene.label_item.replay_journal(journal)
+
+    def set_label_array(self, rgba: np.ndarray):
+        self._scene.label_item.set_array(rgba)
 
     def save_label_to(self, path: Path):
         self._scene.save_label(path)
@@ -1,10 +1,12 @@
 from pathlib import Path
 
-from PyQt5.QtCore import Qt, QLineF, QPoint, QRectF
+from PyQt5.QtCore import Qt, QLineF, QPoint, QRect, QRectF, QSize
 from PyQt5.QtWidgets import QGraphicsSceneMouseEvent, QGraphicsRectItem
-from PyQt5.QtGui import QColor, QPixmap, QPainter, QPen
+from PyQt5.QtGui import QColor, QImage, QPixmap, QPainter, QPen
 import numpy as np
 
+from .tile_journal import TileJournal, TILE_SIZE
+
 
 class LabelLayer(QGraphicsRectItem):
     def __init__(self, parent, sam_signal):
@@ -20,6 +22,9 @@ class LabelLayer(QGraphicsRectItem):
         self._pixmap = QPixmap()
         self._line = QLineF()
         self._sam_mode = False
+        self._dirty_tiles = set()  # (col, row) of tiles changed since last save
+        self._touched = False  # edited by user since load
+        self._unjournaled = False  # content set from array is not in any file yet
 
     def set_brush_color(self, color: QColor):
         self.set_eraser(False)
@@ -40,6 +45,9 @@ class LabelLayer(QGraphicsRectItem):
         painter.setPen(pen)
         painter.drawLine(self._line)
         painter.end()
+        margin = self._brush_size / 2 + 1
+        line_rect = QRectF(self._line.p1(), self._line.p2()).normalized()
+        self.mark_dirty(line_rect.adjusted(-margin, -margin, margin, margin))
         self.update()
 
     def _draw_bundle(self, bundle: np.ndarray):
@@ -52,22 +60,78 @@ class LabelLayer(QGraphicsRectItem):
             painter.drawPoint(x, y)
         self._bundle_to_draw = None
         painter.end()
+        if len(bundle):
+            x_min, y_min = bundle.min(axis=0).tolist()
+            x_max, y_max = bundle.max(axis=0).tolist()
+            self.mark_dirty(QRectF(x_min, y_min, x_max - x_min + 1, y_max - y_min + 1))
         self.update()
 
     def set_image(self, path: str):
         r = self.parentItem().pixmap().rect()
         self.setRect(QRectF(r))
         self._pixmap.load(path)
+        self._dirty_tiles.clear()
+        self._touched = False
+        self._unjournaled = False
+
+    def set_array(self, rgba: np.ndarray):
+        rgba = np.ascontiguousarray(rgba)
+        h, w = rgba.shape[:2]
+        image = QImage(rgba.data, w, h, 4 * w, QImage.Format.Format_RGBA8888)
+        self._pixmap = QPixmap.fromImage(image)
+        self._unjournaled = True
+        self.update()  # to make changes be visible instantly
 
     def clear(self):
         r = self.parentItem().pixmap().rect()
         self.setRect(QRectF(r))
         self._pixmap = QPixmap(r.size())
         self._pixmap.fill(Qt.GlobalColor.transparent)
+        self._dirty_tiles.clear()
+        self._touched = False
+        self._unjournaled = False
         self.update()  # to make changes be visible instantly
 
+    def is_touched(self) -> bool:
+        return self._touched
+
+    def mark_dirty(self, rect: QRectF):
+        self._touched = True
+        if self._unjournaled:
+            # first edit journals whole layer so replay doesn't need array source
+            self._unjournaled = False
+            rect = QRectF(self._pixmap.rect())
+        r = rect.toAlignedRect().intersected(self._pixmap.rect())
+        if r.isEmpty():
+            return
+        for row in range(r.top() // TILE_SIZE, r.bottom() // TILE_SIZE + 1):
+            for col in range(r.left() // TILE_SIZE, r.right() // TILE_SIZE + 1):
+                self._dirty_tiles.add((col, row))
+
+    def take_dirty_tiles(self) -> list[tuple[QPoint, QImage]]:
+        tiles = []
+        for col, row in sorted(self._dirty_tiles):
+            pos = QPoint(col * TILE_SIZE, row * TILE_SIZE)
+            tile_rect = QRect(pos, QSize(TILE_SIZE, TILE_SIZE))
+            tile = self._pixmap.copy(tile_rect.intersected(self._pixmap.rect()))
+            tiles.append((pos, tile.toImage()))
+        self._dirty_tiles.clear()
+        return tiles
+
+    def restore_dirty_tiles(self, positions: list[QPoint]):
+        # puts back tiles whose journal write failed
+        for pos in positions:
+            self._dirty_tiles.add((pos.x() // TILE_SIZE, pos.y() // TILE_SIZE))
+
+    def replay_journal(self, journal: TileJournal):
+        if journal.exists():
+            self._touched = True  # journal holds user edits only
+        journal.replay(self._pixmap)
+        self.update()
+
     def export_pixmap(self, out_path: Path):
         self._pixmap.save(str(out_path))
+        self._dirty_tiles.clear()
 
     def handle_bundle(self, bundle: np.ndarray):
         if self._sam_mode:
@@ -0,0 +1,54 @@
+from pathlib import Path
+
+from PyQt5.QtGui import QImage
+import numpy as np
+
+from .regions import region_classes
+
+IOU_THRESHOLD = 0.5  # min IoU between SAM regions of two frames to propagate
+
+
+def read_rgba(path: Path) -> np.ndarray:
+    image = QImage(str(path)).convertToFormat(QImage.Format.Format_RGBA8888)
+    buffer = image.bits()
+    buffer.setsize(image.byteCount())
+    np_img = np.frombuffer(buffer, dtype=np.uint8)
+    np_img = np_img.reshape((image.height(), image.width(), 4))
+    return np_img.copy()  # detach from QImage buffer
+
+
+def propagate_label(
+    label: np.ndarray,
+    sam_src: np.ndarray,
+    sam_dst: np.ndarray,
+    palette: np.ndarray,
+    threshold: float = IOU_THRESHOLD,
+) -> np.ndarray | None:
+    """Transfers classes of labelled SAM regions of one frame to the
+    best matching (by IoU) SAM regions of another frame.
+    palette is (n_classes, 3) uint8 array of class RGB colors.
+    Returns RGBA label for the destination frame or None if frames differ in size.
+    """
+    if not (label.shape[:2] == sam_src.shape == sam_dst.shape):
+        return None
+    n = int(max(sam_src.max(), sam_dst.max())) + 1
+    src_codes = region_classes(label, sam_src, palette, n)
+    overlap = np.bincount(
+        sam_src.ravel().astype(np.int64) * n + sam_dst.ravel(),
+        minlength=n * n,
+    ).reshape(n, n)
+    src_area = overlap.sum(axis=1)
+    dst_area = overlap.sum(axis=0)
+    union = src_area[:, None] + dst_area[None, :] - overlap
+    iou = overlap / np.maximum(union, 1)
+    iou[0, :] = 0
+    iou[:, 0] = 0
+    iou[src_codes == 0, :] = 0  # unlabelled regions have nothing to propagate
+    best = iou.argmax(axis=0)
+    best_iou = iou[best, np.arange(n)]
+    dst_codes = np.where(best_iou >= threshold, src_codes[best], 0)
+    # lookup table class code -> RGBA, transparent for unlabelled
+    lut = np.zeros((len(palette) + 1, 4), dtype=np.uint8)
+    lut[1:, :3] = palette
+    lut[1:, 3] = 255
+    return lut[dst_codes[sam_dst]]
@@ -1,7 +1,9 @@
 from pathlib import Path
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
 import json
 
-from PyQt5.QtCore import Qt, pyqtSignal, pyqtSlot
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal, pyqtSlot
 from PyQt5.QtGui import QColor, QKeyEvent, QCloseEvent, QIcon, QPixmap
 from PyQt5.QtWidgets import (
     QMainWindow,
@@ -15,13 +17,21 @@ from PyQt5.QtWidgets import (
     QListWidget,
     QListWidgetItem,
 )
+import numpy as np
 
 from .graphics_view import GraphicsView
+from .label_propagation import read_rgba, propagate_label
+from .tile_journal import TileJournal
+
+AUTOSAVE_INTERVAL_MS = 5000
 
 
 class MainWindow(QMainWindow):
     brush_feedback = pyqtSignal(int)  # allows QSlider react on mouse wheel
     sam_signal = pyqtSignal(bool)  # used to propagate sam mode to all widgets
+    prelabel_signal = pyqtSignal(int, np.ndarray)  # delivers pre-label to GUI thread
+    # reports journal errors and unsaved tile positions to GUI thread
+    autosave_failed_signal = pyqtSignal(object, list, str)
 
     def __init__(self, workdir: str):
         super(MainWindow, self).__init__()
@@ -33,13 +43,18 @@ class MainWindow(QMainWindow):
         self._image_dir = self._workdir / "images"
         self._label_dir = self._workdir / "labels"
         self._sam_dir = self._workdir / "sam"
+        self._provisional_dir = self._workdir / "provisional"  # auto_label.py output
+        self._journal_dir = self._workdir / "journal"
         self._label_dir.mkdir(exist_ok=True)
+        self._journal_dir.mkdir(exist_ok=True)
         self._image_stems = [path.stem for path in sorted(self._image_dir.iterdir())]
         with open(self._class_dir, "r") as f:
             self._classes = json.loads("".join(f.readlines()))["classes"]
         ids = [c["id"] for c in self._classes]
         colors = [c["color"] for c in self._classes]
         self._id2color = {k: v for k, v in zip(ids, colors)}
+        palette = [QColor(c).getRgb()[:3] for c in colors]
+        self._palette = np.array(palette, dtype=np.uint8).reshape(-1, 3)
 
         self.brush_feedback.connect(self.on_brush_size_change)
         self._graphics_view = GraphicsView(self.brush_feedback)
@@ -144,6 +159,19 @@ class MainWindow(QMainWindow):
         self._graphics_view.set_brush_color(QColor(colors[0]))
         self.cs_list.setCurrentRow(0)
 
+        # autosave appends changed label tiles to journal of current sample
+        self._journal = None
+        self._autosave_pool = ThreadPoolExecutor(max_workers=1)  # keeps appends ordered
+        self._autosave_timer = QTimer(self)
+        self._autosave_timer.timeout.connect(self.autosave)
+        self._autosave_timer.start(AUTOSAVE_INTERVAL_MS)
+        self.autosave_failed_signal.connect(self.on_autosave_failed)
+
+        # pre-labels are computed off GUI thread and applied via signal
+        self._unreviewed = False  # shown label is pre-label or auto-label
+        self._prelabel_pool = ThreadPoolExecutor(max_workers=1)
+        self.prelabel_signal.connect(self.on_prelabel_ready)
+
     @pyqtSlot(int)
     def on_sam_change(self, state: int):
         if state == Qt.CheckState.Checked:
@@ -179,19 +207,114 @@ class MainWindow(QMainWindow):
         color = self._id2color[idx + 1]
         self._graphics_view.set_brush_color(QColor(color))
 
+    @pyqtSlot()
+    def autosave(self):
+        if self._journal is None:
+            return
+        tiles = self._graphics_view.take_dirty_tiles()
+        if tiles:
+            future = self._autosave_pool.submit(self._journal.append, tiles)
+            positions = [pos for pos, _ in tiles]
+            future.add_done_callback(
+                partial(self._check_autosave, self._journal, positions)
+            )
+
+    def _check_autosave(self, journal: TileJournal, positions: list, future: Future):
+        # runs on worker thread
+        self._report_failure(future)
+        if not future.cancelled() and future.exception() is not None:
+            message = str(future.exception())
+            self.autosave_failed_signal.emit(journal, positions, message)
+
+    @pyqtSlot(object, list, str)
+    def on_autosave_failed(self, journal: TileJournal, positions: list, message: str):
+        self.statusBar().showMessage(f"Autosave failed: {message}")
+        if journal is self._journal:
+            # tiles are retried on next autosave
+            self._graphics_view.restore_dirty_tiles(positions)
+
     def save_current_label(self):
         curr_label_path = self._label_dir / f"{self._image_stems[self._curr_id]}.png"
-        self._graphics_view.save_label_to(curr_label_path)
+        # untouched pre-label or auto-label is not saved unless accepted,
+        # otherwise it would pass for reviewed label
+        if self._graphics_view.is_label_touched() or not self._unreviewed:
+            self._graphics_view.save_label_to(curr_label_path)
+        if self._journal is not None:
+            # waits for pending appends so none of them outlives the full save
+            self._autosave_pool.submit(self._journal.discard).result()
 
     def _load_sample_by_id(self, id: int):
         self._curr_id = id
         name = f"{self._image_stems[self._curr_id]}.png"
         image_path = self._image_dir / name
         label_path = self._label_dir / name
+        provisional_path = self._provisional_dir / name
+        # auto-label written after last save (e.g. over blank label of visited sample)
+        # is shown instead, it becomes reviewed label once edited or accepted
+        self._unreviewed = provisional_path.exists() and (
+            not label_path.exists()
+            or provisional_path.stat().st_mtime_ns > label_path.stat().st_mtime_ns
+        )
+        if self._unreviewed:
+            label_path = provisional_path
         sam_path = self._sam_dir / name
+        journal_path = self._journal_dir / f"{self._image_stems[id]}.journal"
+        self._journal = TileJournal(journal_path)
         self._graphics_view.load_sample(image_path, label_path, sam_path)
+        if self._journal.is_older_than(self._label_dir / name):
+            # crash between label save and journal discard
+            self._journal.discard()
+        self._graphics_view.replay_journal(self._journal)
         self.ds_label.setText(f"Sample: {name}")
 
+    def _request_prelabel(self, src_id: int):
+        # pre-labels current sample by propagating classes from neighbour frame
+        src_name = f"{self._image_stems[src_id]}.png"
+        dst_name = f"{self._image_stems[self._curr_id]}.png"
+        paths = (
+            self._label_dir / src_name,
+            self._sam_dir / src_name,
+            self._sam_dir / dst_name,
+        )
+        if (self._label_dir / dst_name).exists() or self._journal.exists():
+            return
+        if (self._provisional_dir / dst_name).exists():
+            return
+        if not all(p.exists() for p in paths):
+            return
+        future = self._prelabel_pool.submit(
+            self._compute_prelabel, self._curr_id, *paths
+        )
+        future.add_done_callback(self._report_failure)
+
+    def _compute_prelabel(
+        self, dst_id: int, src_label_path: Path, src_sam_path: Path, dst_sam_path: Path
+    ):
+        # runs on worker thread
+        if dst_id != self._curr_id:
+            return  # user has already moved on
+        label = propagate_label(
+            read_rgba(src_label_path),
+            read_rgba(src_sam_path)[..., 0],
+            read_rgba(dst_sam_path)[..., 0],
+            self._palette,
+        )
+        if label is not None:
+            self.prelabel_signal.emit(dst_id, label)
+
+    @pyqtSlot(int, np.ndarray)
+    def on_prelabel_ready(self, sample_id: int, label: np.ndarray):
+        # dropped if sample was switched or edited while pre-label was computed
+        if sample_id != self._curr_id or self._graphics_view.is_label_touched():
+            return
+        self._graphics_view.set_label_array(label)
+        self._unreviewed = True
+
+    @staticmethod
+    def _report_failure(future: Future):
+        if not future.cancelled() and future.exception() is not None:
+            print(f"background task failed: {future.exception()!r}")
+
     def load_latest_sample(self):
         labels = list(self._label_dir.iterdir())
         images = list(self._image_dir.iterdir())
@@ -208,7 +331,10 @@ class MainWindow(QMainWindow):
         corner_case_id = 0 if step < 0 else max_id
         new_id = self._curr_id + step
         new_id = new_id if new_id in range(max_id + 1) else corner_case_id
+        prev_id = self._curr_id
         self._load_sample_by_id(new_id)
+        if abs(new_id - prev_id) == 1:
+            self._request_prelabel(prev_id)
 
     def keyPressEvent(self, a0: QKeyEvent) -> None:
         if a0.key() == Qt.Key.Key_Space:
@@ -217,6 +343,9 @@ class MainWindow(QMainWindow):
             self.sam_checkbox.toggle()
         elif a0.key() == Qt.Key.Key_C:
             self._graphics_view.clear_label()
+        elif a0.key() == Qt.Key.Key_A:
+            self._unreviewed = False
+            self.statusBar().showMessage("Label accepted, it will be saved on switch")
         elif a0.key() == Qt.Key.Key_E:
             self.cs_list.clearSelection()
             self._graphics_view.set_eraser(True)
@@ -234,5 +363,8 @@ class MainWindow(QMainWindow):
         return super().keyPressEvent(a0)
 
     def closeEvent(self, a0: QCloseEvent) -> None:
+        self._autosave_timer.stop()
         self.save_current_label()
+        self._prelabel_pool.shutdown(cancel_futures=True)
+        self._autosave_pool.shutdown()
         return super().closeEvent(a0)
@@ -0,0 +1,30 @@
+import numpy as np
+
+COVERAGE_THRESHOLD = 0.5  # min labelled share of a SAM region to take its class
+
+
+def region_classes(
+    label: np.ndarray, sam: np.ndarray, palette: np.ndarray, n_regions: int
+) -> np.ndarray:
+    """Returns class code (palette index + 1, 0 = unlabelled) of every SAM region
+    whose majority class covers enough of it.
+    label is RGBA array, palette is (n_classes, 3) uint8 array of class RGB colors.
+    """
+    # packs RGBA pixels into uint32 to compare with class colors in one pass each
+    packed = np.ascontiguousarray(label).view(np.uint32)[..., 0]
+    opaque = np.column_stack((palette, np.full(len(palette), 255, dtype=np.uint8)))
+    class_colors = opaque.view(np.uint32)[:, 0]
+    codes = np.zeros(sam.shape, dtype=np.int64)  # 0 is unlabelled
+    for i, color in enumerate(class_colors):
+        codes[packed == color] = i + 1
+    k = len(palette) + 1
+    hist = np.bincount(
+        sam.ravel().astype(np.int64) * k + codes.ravel(),
+        minlength=n_regions * k,
+    ).reshape(n_regions, k)
+    area = np.maximum(hist.sum(axis=1), 1)
+    best = hist[:, 1:].argmax(axis=1) + 1
+    coverage = hist[:, 1:].max(axis=1) / area
+    region_codes = np.where(coverage >= COVERAGE_THRESHOLD, best, 0)
+    region_codes[0] = 0  # pixels outside of any SAM mask
+    return region_codes
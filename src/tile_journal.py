@@ -0,0 +1,92 @@
+from pathlib import Path
+import os
+import struct
+
+from PyQt5.QtCore import QBuffer, QByteArray, QIODevice, QPoint
+from PyQt5.QtGui import QImage, QPainter, QPixmap
+
+TILE_SIZE = 256
+_HEADER = struct.Struct("<iiI")  # tile x, tile y, PNG size
+COMPACT_MIN_SIZE = 16 * 1024 * 1024  # journal size (bytes) to trigger first compaction
+
+
+class TileJournal:
+    """Append-only log of label tiles changed since the last full save.
+    Each record is a PNG snapshot of a whole tile, so replaying records
+    in order restores the latest state of every tile.
+    Once the file grows past a threshold, it is compacted to the last
+    record of every tile.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._compact_at = COMPACT_MIN_SIZE
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def is_older_than(self, label_path: Path) -> bool:
+        # label saved after last journal write already holds all journaled tiles
+        if not (self.path.exists() and label_path.exists()):
+            return False
+        return self.path.stat().st_mtime_ns <= label_path.stat().st_mtime_ns
+
+    def append(self, tiles: list[tuple[QPoint, QImage]]):
+        with open(self.path, "ab") as f:
+            for pos, image in tiles:
+                data = QByteArray()
+                buffer = QBuffer(data)
+                buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+                image.save(buffer, "PNG")
+                buffer.close()
+                f.write(_HEADER.pack(pos.x(), pos.y(), data.size()))
+                f.write(bytes(data))
+        if self.path.stat().st_size >= self._compact_at:
+            self.compact()
+
+    def compact(self):
+        latest = {}
+        for x, y, data in self._read()[0]:
+            latest[(x, y)] = data
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            for (x, y), data in latest.items():
+                f.write(_HEADER.pack(x, y, len(data)))
+                f.write(data)
+        os.replace(tmp_path, self.path)  # atomic, old journal stays valid on crash
+        # doubling threshold keeps compaction cost amortized
+        self._compact_at = max(COMPACT_MIN_SIZE, 2 * self.path.stat().st_size)
+
+    def _read(self) -> tuple[list[tuple[int, int, bytes]], int]:
+        # returns complete records and the offset where the last one ends
+        records = []
+        if not self.path.exists():
+            return records, 0
+        raw = self.path.read_bytes()
+        end = 0
+        while end + _HEADER.size <= len(raw):
+            x, y, size = _HEADER.unpack_from(raw, end)
+            if end + _HEADER.size + size > len(raw):
+                break  # last record was cut off by crash
+            data = raw[end + _HEADER.size : end + _HEADER.size + size]
+            records.append((x, y, data))
+            end += _HEADER.size + size
+        return records, end
+
+    def replay(self, pixmap: QPixmap):
+        if not self.path.exists():
+            return
+        records, end = self._read()
+        if end < self.path.stat().st_size:
+            # drops torn tail, otherwise next appends would be read from its offset
+            os.truncate(self.path, end)
+        painter = QPainter(pixmap)
+        # tiles replace pixels as is, including erased (transparent) ones
+        painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Source)
+        for x, y, data in records:
+            painter.drawImage(QPoint(x, y), QImage.fromData(data, "PNG"))
+        painter.end()
+
+    def discard(self):
+        self.path.unlink(missing_ok=True)
+        self._compact_at = COMPACT_MIN_SIZE